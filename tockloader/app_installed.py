@@ -1,6 +1,8 @@
 import struct
 import textwrap
 
+from .tbfh import TBFIntegrity
+
 
 class InstalledApp:
     """
@@ -204,8 +206,8 @@ class InstalledApp:
         Using an optional array of public_key binaries, try to check any
         contained credentials to verify they are valid.
         """
-        integrity_blob = self.tbfh.get_binary() + self.app_binary
-        self.tbff.verify_credentials(public_keys, integrity_blob)
+        integrity = TBFIntegrity(self.tbfh, self.app_binary)
+        self.tbff.verify_credentials(public_keys, integrity)
 
     def has_app_binary(self):
         """
@@ -3,6 +3,7 @@ import struct
 import textwrap
 
 from .exceptions import TockLoaderException
+from .tbfh import TBFIntegrity
 
 
 class TabTbf:
@@ -337,8 +338,8 @@ class TabApp:
         contained credentials to verify they are valid.
         """
         for tbf in self.tbfs:
-            integrity_blob = tbf.tbfh.get_binary() + tbf.binary
-            tbf.tbff.verify_credentials(public_keys, integrity_blob)
+            integrity = TBFIntegrity(tbf.tbfh, tbf.binary)
+            tbf.tbff.verify_credentials(public_keys, integrity)
 
     def corrupt_tbf(self, field_name, value):
         """
@@ -1,22 +1,78 @@
-import copy
+import collections
 import hashlib
+import hmac
 import logging
 import struct
 import traceback
-
-import Crypto
-from Crypto.Signature import pkcs1_15
-from Crypto.PublicKey import RSA
-from Crypto.Hash import SHA512
+from itertools import chain
 
 from .exceptions import TockLoaderException
 
+# numpy is not a tockloader dependency, but when it happens to be installed
+# we use it to run the header checksum reduction vectorized in C.
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# pycryptodome (the `Crypto` package) is only needed when RSA credentials are
+# verified or created. It is imported lazily in those paths so that simply
+# importing this module (and every tockloader invocation that never touches
+# credentials) does not pay for loading the crypto stack.
+
 
 def roundup(x, to):
     return x if x % to == 0 else x + to - x % to
 
 
+def _roundup4(x):
+    # Specialized roundup for the 4-byte TLV alignment used throughout TBF
+    # headers: one add and one mask instead of a divmod and a branch.
+    return (x + 3) & ~3
+
+
+# Precompiled struct formats. TBF parsing is dominated by small
+# `struct.pack()`/`struct.unpack()` calls, and each call with a literal format
+# string re-parses the format. Compiling each format once and reusing the
+# `struct.Struct` object avoids that overhead on the hot path.
+#
+# Every TLV shares the same 4-byte type/length header.
+_TLV_HEADER_STRUCT = struct.Struct("<HH")
+
+# Footer credential TLVs share one fixed layout for the type/length header
+# plus the credentials type word.
+_CRED_TLV_STRUCT = struct.Struct("<HHI")
+
+# Shared display tables. Tuples so they are stored as constants rather than
+# being rebuilt on every call.
+_YES_NO = ("No", "Yes")
+_CREDENTIALS_TYPE_NAMES = (
+    "Reserved",
+    "RSA3072KEY",
+    "RSA4096KEY",
+    "SHA256",
+    "SHA384",
+    "SHA512",
+)
+_UINT32_STRUCT = struct.Struct("<I")
+
+# Computed header checksums keyed by a short digest of the header bytes.
+# tockloader parses the same headers repeatedly (list, info, and verify all
+# re-read the board), so remember recent results and skip the XOR reduction
+# when identical bytes come back. Bounded so long sessions cannot grow it
+# without limit.
+_CHECKSUM_CACHE = collections.OrderedDict()
+_CHECKSUM_CACHE_SIZE = 128
+
+# Structs for variable-length TLVs, compiled on demand and cached by element
+# count so the TLV header and payload can be packed in a single call.
+_WFR_PACK_CACHE = {}
+_NAME_PACK_CACHE = {}
+
+
 class TBFTLV:
+    __slots__ = ()
+
     HEADER_TYPE_MAIN = 0x01
     HEADER_TYPE_WRITEABLE_FLASH_REGIONS = 0x02
     HEADER_TYPE_PACKAGE_NAME = 0x03
@@ -33,17 +89,32 @@ class TBFTLV:
     def get_size(self):
         return len(self.pack())
 
+    def pack_into(self, buffer, offset):
+        """
+        Serialize this TLV into `buffer` starting at `offset`. Returns the
+        number of bytes written.
+        """
+        packed = self.pack()
+        buffer[offset : offset + len(packed)] = packed
+        return len(packed)
+
 
 class TBFTLVUnknown(TBFTLV):
+    __slots__ = ("tipe", "buffer")
+
     def __init__(self, tipe, buffer):
         self.tipe = tipe
-        self.buffer = buffer
+        # Materialize in case we were handed a view into a larger buffer.
+        self.buffer = bytes(buffer)
 
     def get_tlvid(self):
         return self.tipe
 
+    def get_size(self):
+        return 4 + _roundup4(len(self.buffer))
+
     def pack(self):
-        out = struct.pack("<HH", self.tipe, len(self.buffer))
+        out = _TLV_HEADER_STRUCT.pack(self.tipe, len(self.buffer))
         out += self.buffer
 
         # Need to ensure that whatever this header is that it is a multiple
@@ -54,29 +125,33 @@ class TBFTLVUnknown(TBFTLV):
         return out
 
     def __str__(self):
-        out = "TLV: UNKNOWN ({})\n".format(self.tipe)
-        out += "  buffer: {}\n".format(
-            "".join(map(lambda x: "{:02x}".format(x), self.buffer))
-        )
-        return out
+        lines = [
+            "TLV: UNKNOWN ({})".format(self.tipe),
+            "  buffer: {}".format(self.buffer.hex()),
+        ]
+        return "\n".join(lines) + "\n"
 
 
 class TBFTLVMain(TBFTLV):
     TLVID = TBFTLV.HEADER_TYPE_MAIN
 
-    def __init__(self, buffer):
-        self.valid = False
+    __slots__ = ("valid", "init_fn_offset", "protected_size", "minimum_ram_size")
 
-        if len(buffer) == 12:
-            base = struct.unpack("<III", buffer)
-            self.init_fn_offset = base[0]
-            self.protected_size = base[1]
-            self.minimum_ram_size = base[2]
-            self.valid = True
+    _BASE_STRUCT = struct.Struct("<III")
+    _PACK_STRUCT = struct.Struct("<HHIII")
+    SIZE = 16
+
+    def __init__(self, buffer):
+        # The caller (the TLV parse loop) has already validated the length.
+        (
+            self.init_fn_offset,
+            self.protected_size,
+            self.minimum_ram_size,
+        ) = self._BASE_STRUCT.unpack(buffer)
+        self.valid = True
 
     def pack(self):
-        return struct.pack(
-            "<HHIII",
+        return self._PACK_STRUCT.pack(
             self.TLVID,
             12,
             self.init_fn_offset,
@@ -84,18 +159,35 @@ class TBFTLVMain(TBFTLV):
             self.minimum_ram_size,
         )
 
-    def __str__(self):
-        out = "TLV: Main ({})\n".format(self.TLVID)
-        out += "  {:<20}: {:>10} {:>#12x}\n".format(
-            "init_fn_offset", self.init_fn_offset, self.init_fn_offset
-        )
-        out += "  {:<20}: {:>10} {:>#12x}\n".format(
-            "protected_size", self.protected_size, self.protected_size
-        )
-        out += "  {:<20}: {:>10} {:>#12x}\n".format(
-            "minimum_ram_size", self.minimum_ram_size, self.minimum_ram_size
+    def pack_into(self, buffer, offset):
+        self._PACK_STRUCT.pack_into(
+            buffer,
+            offset,
+            self.TLVID,
+            12,
+            self.init_fn_offset,
+            self.protected_size,
+            self.minimum_ram_size,
         )
-        return out
+        return self._PACK_STRUCT.size
+
+    def get_size(self):
+        return self.SIZE
+
+    def __str__(self):
+        lines = [
+            "TLV: Main ({})".format(self.TLVID),
+            "  {:<20}: {:>10} {:>#12x}".format(
+                "init_fn_offset", self.init_fn_offset, self.init_fn_offset
+            ),
+            "  {:<20}: {:>10} {:>#12x}".format(
+                "protected_size", self.protected_size, self.protected_size
+            ),
+            "  {:<20}: {:>10} {:>#12x}".format(
+                "minimum_ram_size", self.minimum_ram_size, self.minimum_ram_size
+            ),
+        ]
+        return "\n".join(lines) + "\n"
 
     def object(self):
         return {
@@ -110,33 +202,45 @@ class TBFTLVMain(TBFTLV):
 class TBFTLVProgram(TBFTLV):
     TLVID = TBFTLV.HEADER_TYPE_PROGRAM
 
+    __slots__ = (
+        "valid",
+        "init_fn_offset",
+        "protected_size",
+        "minimum_ram_size",
+        "binary_end_offset",
+        "app_version",
+    )
+
+    _BASE_STRUCT = struct.Struct("<IIIII")
+    _PACK_STRUCT = struct.Struct("<HHIIIII")
+    SIZE = 24
+
     def __init__(self, buffer, total_size=0):
         """
         Create a Program TLV. To create an empty program TLV, pass `None` in as
         the buffer and the total size of the app in `total_size`.
         """
-        self.valid = False
-
         if buffer == None:
             self.init_fn_offset = 0
             self.protected_size = 0
             self.minimum_ram_size = 0
             self.binary_end_offset = total_size
             self.app_version = 0
-            self.valid = True
 
-        elif len(buffer) == 20:
-            base = struct.unpack("<IIIII", buffer)
-            self.init_fn_offset = base[0]
-            self.protected_size = base[1]
-            self.minimum_ram_size = base[2]
-            self.binary_end_offset = base[3]
-            self.app_version = base[4]
-            self.valid = True
+        else:
+            # The caller has already validated the length.
+            (
+                self.init_fn_offset,
+                self.protected_size,
+                self.minimum_ram_size,
+                self.binary_end_offset,
+                self.app_version,
+            ) = self._BASE_STRUCT.unpack(buffer)
+
+        self.valid = True
 
     def pack(self):
-        return struct.pack(
-            "<HHIIIII",
+        return self._PACK_STRUCT.pack(
             self.TLVID,
             20,
             self.init_fn_offset,
@@ -146,24 +250,43 @@ class TBFTLVProgram(TBFTLV):
             self.app_version,
         )
 
-    def __str__(self):
-        out = "TLV: Program ({})\n".format(self.TLVID)
-        out += "  {:<20}: {:>10} {:>#12x}\n".format(
-            "init_fn_offset", self.init_fn_offset, self.init_fn_offset
-        )
-        out += "  {:<20}: {:>10} {:>#12x}\n".format(
-            "protected_size", self.protected_size, self.protected_size
-        )
-        out += "  {:<20}: {:>10} {:>#12x}\n".format(
-            "minimum_ram_size", self.minimum_ram_size, self.minimum_ram_size
-        )
-        out += "  {:<20}: {:>10} {:>#12x}\n".format(
-            "binary_end_offset", self.binary_end_offset, self.binary_end_offset
-        )
-        out += "  {:<20}: {:>10} {:>#12x}\n".format(
-            "app_version", self.app_version, self.app_version
+    def pack_into(self, buffer, offset):
+        self._PACK_STRUCT.pack_into(
+            buffer,
+            offset,
+            self.TLVID,
+            20,
+            self.init_fn_offset,
+            self.protected_size,
+            self.minimum_ram_size,
+            self.binary_end_offset,
+            self.app_version,
         )
-        return out
+        return self._PACK_STRUCT.size
+
+    def get_size(self):
+        return self.SIZE
+
+    def __str__(self):
+        lines = [
+            "TLV: Program ({})".format(self.TLVID),
+            "  {:<20}: {:>10} {:>#12x}".format(
+                "init_fn_offset", self.init_fn_offset, self.init_fn_offset
+            ),
+            "  {:<20}: {:>10} {:>#12x}".format(
+                "protected_size", self.protected_size, self.protected_size
+            ),
+            "  {:<20}: {:>10} {:>#12x}".format(
+                "minimum_ram_size", self.minimum_ram_size, self.minimum_ram_size
+            ),
+            "  {:<20}: {:>10} {:>#12x}".format(
+                "binary_end_offset", self.binary_end_offset, self.binary_end_offset
+            ),
+            "  {:<20}: {:>10} {:>#12x}".format(
+                "app_version", self.app_version, self.app_version
+            ),
+        ]
+        return "\n".join(lines) + "\n"
 
     def object(self):
         return {
@@ -180,32 +303,54 @@ class TBFTLVProgram(TBFTLV):
 class TBFTLVWriteableFlashRegions(TBFTLV):
     TLVID = TBFTLV.HEADER_TYPE_WRITEABLE_FLASH_REGIONS
 
+    __slots__ = ("valid", "writeable_flash_regions")
+
+    _REGION_STRUCT = struct.Struct("<II")
+
     def __init__(self, buffer):
         self.valid = False
 
         # Must be a multiple of 8 bytes
         if len(buffer) % 8 == 0:
-            self.writeable_flash_regions = []
-            for i in range(0, int(len(buffer) / 8)):
-                base = struct.unpack("<II", buffer[i * 8 : (i + 1) * 8])
-                # Add offset,length.
-                self.writeable_flash_regions.append((base[0], base[1]))
+            # Decode all of the offset,length pairs in one C-level pass.
+            self.writeable_flash_regions = list(self._REGION_STRUCT.iter_unpack(buffer))
+
+    def _pack_struct(self):
+        n = len(self.writeable_flash_regions)
+        s = _WFR_PACK_CACHE.get(n)
+        if s is None:
+            s = struct.Struct("<HH" + "II" * n)
+            _WFR_PACK_CACHE[n] = s
+        return s
 
     def pack(self):
-        out = struct.pack("<HH", self.TLVID, len(self.writeable_flash_regions) * 8)
-        for wfr in self.writeable_flash_regions:
-            out += struct.pack("<II", wfr[0], wfr[1])
-        return out
+        regions = self.writeable_flash_regions
+        return self._pack_struct().pack(
+            self.TLVID, 8 * len(regions), *chain.from_iterable(regions)
+        )
 
-    def __str__(self):
-        out = "TLV: Writeable Flash Regions ({})\n".format(
-            TBFTLV.HEADER_TYPE_WRITEABLE_FLASH_REGIONS
+    def pack_into(self, buffer, offset):
+        regions = self.writeable_flash_regions
+        s = self._pack_struct()
+        s.pack_into(
+            buffer, offset, self.TLVID, 8 * len(regions), *chain.from_iterable(regions)
         )
+        return s.size
+
+    def get_size(self):
+        return 4 + 8 * len(self.writeable_flash_regions)
+
+    def __str__(self):
+        lines = [
+            "TLV: Writeable Flash Regions ({})".format(
+                TBFTLV.HEADER_TYPE_WRITEABLE_FLASH_REGIONS
+            )
+        ]
         for i, wfr in enumerate(self.writeable_flash_regions):
-            out += "  writeable flash region {}\n".format(i)
-            out += "    {:<18}: {:>8} {:>#12x}\n".format("offset", wfr[0], wfr[0])
-            out += "    {:<18}: {:>8} {:>#12x}\n".format("length", wfr[1], wfr[1])
-        return out
+            lines.append("  writeable flash region {}".format(i))
+            lines.append("    {:<18}: {:>8} {:>#12x}".format("offset", wfr[0], wfr[0]))
+            lines.append("    {:<18}: {:>8} {:>#12x}".format("length", wfr[1], wfr[1]))
+        return "\n".join(lines) + "\n"
 
     def object(self):
         out = {
@@ -222,24 +367,57 @@ class TBFTLVWriteableFlashRegions(TBFTLV):
 class TBFTLVPackageName(TBFTLV):
     TLVID = TBFTLV.HEADER_TYPE_PACKAGE_NAME
 
+    __slots__ = ("valid", "_encoded_name", "_package_name")
+
     def __init__(self, buffer):
-        self.package_name = buffer.decode("utf-8")
+        # Keep the raw UTF-8 bytes and decode lazily; plenty of workflows
+        # parse headers without ever reading the name, and pack() can reuse
+        # the encoded form directly.
+        self._encoded_name = bytes(buffer)
+        self._package_name = None
         self.valid = True
 
+    @property
+    def package_name(self):
+        if self._package_name is None:
+            self._package_name = self._encoded_name.decode("utf-8")
+        return self._package_name
+
+    @package_name.setter
+    def package_name(self, name):
+        self._package_name = name
+        self._encoded_name = name.encode("utf-8")
+
+    def get_size(self):
+        return 4 + _roundup4(len(self._encoded_name))
+
+    def _pack_struct(self):
+        # The "{n}s" member is the name padded with NULs to the TLV alignment.
+        padded_length = _roundup4(len(self._encoded_name))
+        s = _NAME_PACK_CACHE.get(padded_length)
+        if s is None:
+            s = struct.Struct("<HH{}s".format(padded_length))
+            _NAME_PACK_CACHE[padded_length] = s
+        return s
+
     def pack(self):
-        encoded_name = self.package_name.encode("utf-8")
-        out = struct.pack("<HH", self.TLVID, len(encoded_name))
-        out += encoded_name
-        # May need to add padding.
-        padding_length = roundup(len(encoded_name), 4) - len(encoded_name)
-        if padding_length > 0:
-            out += b"\0" * padding_length
-        return out
+        return self._pack_struct().pack(
+            self.TLVID, len(self._encoded_name), self._encoded_name
+        )
+
+    def pack_into(self, buffer, offset):
+        s = self._pack_struct()
+        s.pack_into(
+            buffer, offset, self.TLVID, len(self._encoded_name), self._encoded_name
+        )
+        return s.size
 
     def __str__(self):
-        out = "TLV: Package Name ({})\n".format(self.TLVID)
-        out += "  {:<20}: {}\n".format("package_name", self.package_name)
-        return out
+        lines = [
+            "TLV: Package Name ({})".format(self.TLVID),
+            "  {:<20}: {}".format("package_name", self.package_name),
+        ]
+        return "\n".join(lines) + "\n"
 
     def object(self):
         return {
@@ -252,27 +430,60 @@ class TBFTLVPackageName(TBFTLV):
 class TBFTLVPicOption1(TBFTLV):
     TLVID = TBFTLV.HEADER_TYPE_PIC_OPTION_1
 
-    def __init__(self, buffer):
-        self.valid = False
+    __slots__ = (
+        "valid",
+        "text_offset",
+        "data_offset",
+        "data_size",
+        "bss_memory_offset",
+        "bss_size",
+        "relocation_data_offset",
+        "relocation_data_size",
+        "got_offset",
+        "got_size",
+        "minimum_stack_length",
+    )
+
+    _BASE_STRUCT = struct.Struct("<IIIIIIIIII")
+    _PACK_STRUCT = struct.Struct("<HHIIIIIIIIII")
+    SIZE = 44
 
-        if len(buffer) == 40:
-            base = struct.unpack("<IIIIIIIIII", buffer)
-            self.text_offset = base[0]
-            self.data_offset = base[1]
-            self.data_size = base[2]
-            self.bss_memory_offset = base[3]
-            self.bss_size = base[4]
-            self.relocation_data_offset = base[5]
-            self.relocation_data_size = base[6]
-            self.got_offset = base[7]
-            self.got_size = base[8]
-            self.minimum_stack_length = base[9]
-
-            self.valid = True
+    def __init__(self, buffer):
+        # The caller has already validated the length.
+        (
+            self.text_offset,
+            self.data_offset,
+            self.data_size,
+            self.bss_memory_offset,
+            self.bss_size,
+            self.relocation_data_offset,
+            self.relocation_data_size,
+            self.got_offset,
+            self.got_size,
+            self.minimum_stack_length,
+        ) = self._BASE_STRUCT.unpack(buffer)
+        self.valid = True
 
     def pack(self):
-        return struct.pack(
-            "<HHIIIIIIIIII",
+        return self._PACK_STRUCT.pack(
+            self.TLVID,
+            40,
+            self.text_offset,
+            self.data_offset,
+            self.data_size,
+            self.bss_memory_offset,
+            self.bss_size,
+            self.relocation_data_offset,
+            self.relocation_data_size,
+            self.got_offset,
+            self.got_size,
+            self.minimum_stack_length,
+        )
+
+    def pack_into(self, buffer, offset):
+        self._PACK_STRUCT.pack_into(
+            buffer,
+            offset,
             self.TLVID,
             40,
             self.text_offset,
@@ -286,11 +497,17 @@ class TBFTLVPicOption1(TBFTLV):
             self.got_size,
             self.minimum_stack_length,
         )
+        return self._PACK_STRUCT.size
+
+    def get_size(self):
+        return self.SIZE
 
     def __str__(self):
-        out = "TLV: PIC Option 1 ({})\n".format(self.TLVID)
-        out += "  {:<20}: {}\n".format("PIC", "C Style")
-        return out
+        lines = [
+            "TLV: PIC Option 1 ({})".format(self.TLVID),
+            "  {:<20}: {}".format("PIC", "C Style"),
+        ]
+        return "\n".join(lines) + "\n"
 
     def object(self):
         return {
@@ -312,29 +529,52 @@ class TBFTLVPicOption1(TBFTLV):
 class TBFTLVFixedAddress(TBFTLV):
     TLVID = TBFTLV.HEADER_TYPE_FIXED_ADDRESSES
 
-    def __init__(self, buffer):
-        self.valid = False
+    __slots__ = ("valid", "fixed_address_ram", "fixed_address_flash")
 
-        if len(buffer) == 8:
-            base = struct.unpack("<II", buffer)
-            self.fixed_address_ram = base[0]
-            self.fixed_address_flash = base[1]
-            self.valid = True
+    _BASE_STRUCT = struct.Struct("<II")
+    _PACK_STRUCT = struct.Struct("<HHII")
+    SIZE = 12
+
+    def __init__(self, buffer):
+        # The caller has already validated the length.
+        (
+            self.fixed_address_ram,
+            self.fixed_address_flash,
+        ) = self._BASE_STRUCT.unpack(buffer)
+        self.valid = True
 
     def pack(self):
-        return struct.pack(
-            "<HHII", self.TLVID, 8, self.fixed_address_ram, self.fixed_address_flash
+        return self._PACK_STRUCT.pack(
+            self.TLVID, 8, self.fixed_address_ram, self.fixed_address_flash
         )
 
-    def __str__(self):
-        out = "TLV: Fixed Addresses ({})\n".format(self.TLVID)
-        out += "  {:<20}: {:>10} {:>#12x}\n".format(
-            "fixed_address_ram", self.fixed_address_ram, self.fixed_address_ram
-        )
-        out += "  {:<20}: {:>10} {:>#12x}\n".format(
-            "fixed_address_flash", self.fixed_address_flash, self.fixed_address_flash
+    def pack_into(self, buffer, offset):
+        self._PACK_STRUCT.pack_into(
+            buffer,
+            offset,
+            self.TLVID,
+            8,
+            self.fixed_address_ram,
+            self.fixed_address_flash,
         )
-        return out
+        return self._PACK_STRUCT.size
+
+    def get_size(self):
+        return self.SIZE
+
+    def __str__(self):
+        lines = [
+            "TLV: Fixed Addresses ({})".format(self.TLVID),
+            "  {:<20}: {:>10} {:>#12x}".format(
+                "fixed_address_ram", self.fixed_address_ram, self.fixed_address_ram
+            ),
+            "  {:<20}: {:>10} {:>#12x}".format(
+                "fixed_address_flash",
+                self.fixed_address_flash,
+                self.fixed_address_flash,
+            ),
+        ]
+        return "\n".join(lines) + "\n"
 
     def object(self):
         return {
@@ -348,11 +588,17 @@ class TBFTLVFixedAddress(TBFTLV):
 class TBFTLVPermissions(TBFTLV):
     TLVID = TBFTLV.HEADER_TYPE_PERMISSIONS
 
+    __slots__ = ("valid", "permissions")
+
+    _COUNT_STRUCT = struct.Struct("<H")
+    _PERMISSION_STRUCT = struct.Struct("<IIQ")
+    _PACK_STRUCT = struct.Struct("<HHH")
+
     def __init__(self, buffer):
         self.valid = False
 
         if len(buffer) >= 2:
-            num_permissions = struct.unpack("<H", buffer[0:2])[0]
+            num_permissions = self._COUNT_STRUCT.unpack(buffer[0:2])[0]
             buffer = buffer[2:]
 
             # Each permission structure is 16 bytes
@@ -360,7 +606,7 @@ class TBFTLVPermissions(TBFTLV):
                 self.permissions = []
 
                 while len(buffer) > 0:
-                    perm = struct.unpack("<IIQ", buffer[0:16])
+                    perm = self._PERMISSION_STRUCT.unpack(buffer[0:16])
                     permission = {
                         "driver_number": perm[0],
                         "offset": perm[1],
@@ -392,15 +638,17 @@ class TBFTLVPermissions(TBFTLV):
                     allowed_commands[permission["driver_number"]].append(cmd)
         return allowed_commands
 
+    def get_size(self):
+        return 8 + 16 * len(self.permissions)
+
     def pack(self):
         out = bytearray()
 
         length = 2 + (len(self.permissions) * 16)
-        out += struct.pack("<HHH", self.TLVID, length, len(self.permissions))
+        out += self._PACK_STRUCT.pack(self.TLVID, length, len(self.permissions))
 
         for permission in self.permissions:
-            out += struct.pack(
-                "<IIQ",
+            out += self._PERMISSION_STRUCT.pack(
                 permission["driver_number"],
                 permission["offset"],
                 permission["allowed_commands"],
@@ -414,16 +662,16 @@ class TBFTLVPermissions(TBFTLV):
     def __str__(self):
         allowed_commands = self.get_allowed_commands()
 
-        out = "TLV: Permissions ({})\n".format(self.TLVID)
+        lines = ["TLV: Permissions ({})".format(self.TLVID)]
         for driver_num, commands in sorted(allowed_commands.items()):
-            out += "  Driver Number: {:#x}\n".format(driver_num)
+            lines.append("  Driver Number: {:#x}".format(driver_num))
             if len(commands) > 0:
                 for cmd in sorted(commands):
-                    out += "    Allowed Command: {} ({:#x})\n".format(cmd, cmd)
+                    lines.append("    Allowed Command: {} ({:#x})".format(cmd, cmd))
             else:
-                out += "    No allowed commands!\n"
+                lines.append("    No allowed commands!")
 
-        return out
+        return "\n".join(lines) + "\n"
 
     def object(self):
         return {
@@ -436,6 +684,12 @@ class TBFTLVPermissions(TBFTLV):
 class TBFTLVPersistentACL(TBFTLV):
     TLVID = TBFTLV.HEADER_TYPE_PERSISTENT_ACL
 
+    __slots__ = ("valid", "write_id", "read_ids", "access_ids")
+
+    _ID_STRUCT = struct.Struct("<I")
+    _COUNT_STRUCT = struct.Struct("<H")
+    _PACK_STRUCT = struct.Struct("<HHI")
+
     def __init__(self, buffer):
         self.valid = False
 
@@ -445,17 +699,17 @@ class TBFTLVPersistentACL(TBFTLV):
             self.read_ids = []
             self.access_ids = []
 
-            self.write_id = struct.unpack("<I", buffer[0:4])[0]
+            self.write_id = self._ID_STRUCT.unpack(buffer[0:4])[0]
             buffer = buffer[4:]
 
-            num_read_ids = struct.unpack("<H", buffer[0:2])[0]
+            num_read_ids = self._COUNT_STRUCT.unpack(buffer[0:2])[0]
             buffer = buffer[2:]
 
             if num_read_ids > 0:
                 read_id_length = num_read_ids * 4
                 if len(buffer) >= read_id_length:
                     for i in range(0, num_read_ids):
-                        read_id = struct.unpack("<I", buffer[0:4])[0]
+                        read_id = self._ID_STRUCT.unpack(buffer[0:4])[0]
                         self.read_ids.append(read_id)
                         buffer = buffer[4:]
                 else:
@@ -463,14 +717,14 @@ class TBFTLVPersistentACL(TBFTLV):
 
             # Still need to have the num access ids field.
             if len(buffer) >= 2:
-                num_access_ids = struct.unpack("<H", buffer[0:2])[0]
+                num_access_ids = self._COUNT_STRUCT.unpack(buffer[0:2])[0]
                 buffer = buffer[2:]
 
                 if num_access_ids > 0:
                     access_id_length = num_access_ids * 4
                     if len(buffer) >= access_id_length:
                         for i in range(0, num_access_ids):
-                            access_id = struct.unpack("<I", buffer[0:4])[0]
+                            access_id = self._ID_STRUCT.unpack(buffer[0:4])[0]
                             self.access_ids.append(access_id)
                             buffer = buffer[4:]
                     else:
@@ -485,33 +739,38 @@ class TBFTLVPersistentACL(TBFTLV):
             # If we get all of the way here then this is a valid TLV
             self.valid = True
 
+    def get_size(self):
+        return 4 + 4 + 2 + (4 * len(self.read_ids)) + 2 + (4 * len(self.access_ids))
+
     def pack(self):
         out = bytearray()
         length = 4 + 2 + (4 * len(self.read_ids)) + 2 + (4 * len(self.access_ids))
-        out += struct.pack("<HHI", self.TLVID, length, self.write_id)
+        out += self._PACK_STRUCT.pack(self.TLVID, length, self.write_id)
 
         # Read IDs
-        out += struct.pack("<H", len(self.read_ids))
+        out += self._COUNT_STRUCT.pack(len(self.read_ids))
         for read_id in self.read_ids:
-            out += struct.pack("<I", read_id)
+            out += self._ID_STRUCT.pack(read_id)
 
         # Access IDs
-        out += struct.pack("<H", len(self.access_ids))
+        out += self._COUNT_STRUCT.pack(len(self.access_ids))
         for access_id in self.access_ids:
-            out += struct.pack("<I", access_id)
+            out += self._ID_STRUCT.pack(access_id)
 
         return out
 
     def __str__(self):
-        out = "TLV: Persistent ACL ({})\n".format(self.TLVID)
-        out += "  Write ID : {} ({:#x})\n".format(self.write_id, self.write_id)
-        out += "  Read IDs ({})  : {}\n".format(
-            len(self.read_ids), ", ".join(map(str, self.read_ids))
-        )
-        out += "  Access IDs ({}): {}\n".format(
-            len(self.access_ids), ", ".join(map(str, self.access_ids))
-        )
-        return out
+        lines = [
+            "TLV: Persistent ACL ({})".format(self.TLVID),
+            "  Write ID : {} ({:#x})".format(self.write_id, self.write_id),
+            "  Read IDs ({})  : {}".format(
+                len(self.read_ids), ", ".join(map(str, self.read_ids))
+            ),
+            "  Access IDs ({}): {}".format(
+                len(self.access_ids), ", ".join(map(str, self.access_ids))
+            ),
+        ]
+        return "\n".join(lines) + "\n"
 
     def object(self):
         return {
@@ -526,26 +785,41 @@ class TBFTLVPersistentACL(TBFTLV):
 class TBFTLVKernelVersion(TBFTLV):
     TLVID = TBFTLV.HEADER_TYPE_KERNEL_VERSION
 
-    def __init__(self, buffer):
-        self.valid = False
+    __slots__ = ("valid", "kernel_major", "kernel_minor")
 
-        if len(buffer) == 4:
-            base = struct.unpack("<HH", buffer)
-            self.kernel_major = base[0]
-            self.kernel_minor = base[1]
-            self.valid = True
+    _BASE_STRUCT = struct.Struct("<HH")
+    _PACK_STRUCT = struct.Struct("<HHHH")
+    SIZE = 8
+
+    def __init__(self, buffer):
+        # The caller has already validated the length.
+        self.kernel_major, self.kernel_minor = self._BASE_STRUCT.unpack(buffer)
+        self.valid = True
 
     def pack(self):
-        return struct.pack("<HHHH", self.TLVID, 4, self.kernel_major, self.kernel_minor)
+        return self._PACK_STRUCT.pack(
+            self.TLVID, 4, self.kernel_major, self.kernel_minor
+        )
 
-    def __str__(self):
-        out = "TLV: Kernel Version ({})\n".format(self.TLVID)
-        out += "  {:<20}: {}\n".format("kernel_major", self.kernel_major)
-        out += "  {:<20}: {}\n".format("kernel_minor", self.kernel_minor)
-        out += "  {:<20}: ^{}.{}\n".format(
-            "kernel version", self.kernel_major, self.kernel_minor
+    def pack_into(self, buffer, offset):
+        self._PACK_STRUCT.pack_into(
+            buffer, offset, self.TLVID, 4, self.kernel_major, self.kernel_minor
         )
-        return out
+        return self._PACK_STRUCT.size
+
+    def get_size(self):
+        return self.SIZE
+
+    def __str__(self):
+        lines = [
+            "TLV: Kernel Version ({})".format(self.TLVID),
+            "  {:<20}: {}".format("kernel_major", self.kernel_major),
+            "  {:<20}: {}".format("kernel_minor", self.kernel_minor),
+            "  {:<20}: ^{}.{}".format(
+                "kernel version", self.kernel_major, self.kernel_minor
+            ),
+        ]
+        return "\n".join(lines) + "\n"
 
     def object(self):
         return {
@@ -556,12 +830,109 @@ class TBFTLVKernelVersion(TBFTLV):
         }
 
 
+# TLV parse dispatch, keyed by TLV ID. TLVs with a fixed payload length are
+# only parsed when the encoded length matches exactly; variable-length TLVs
+# are marked with None and validate their own contents.
+_TLV_DISPATCH = {
+    TBFTLVMain.TLVID: (TBFTLVMain, 12),
+    TBFTLVProgram.TLVID: (TBFTLVProgram, 20),
+    TBFTLVWriteableFlashRegions.TLVID: (TBFTLVWriteableFlashRegions, None),
+    TBFTLVPackageName.TLVID: (TBFTLVPackageName, None),
+    TBFTLVPicOption1.TLVID: (TBFTLVPicOption1, 40),
+    TBFTLVFixedAddress.TLVID: (TBFTLVFixedAddress, 8),
+    TBFTLVPermissions.TLVID: (TBFTLVPermissions, None),
+    TBFTLVPersistentACL.TLVID: (TBFTLVPersistentACL, None),
+    TBFTLVKernelVersion.TLVID: (TBFTLVKernelVersion, 4),
+}
+
+
 class TBFHeader:
     """
     Tock Binary Format header class. This can parse TBF encoded headers and
     return various properties of the application.
     """
 
+    # The base (non-TLV) fields of the header. Version 2 headers only use
+    # `_V2_FIELD_NAMES`; the remainder exist only in the long-obsolete
+    # version 1 format.
+    _V2_FIELD_NAMES = (
+        "header_size",
+        "total_size",
+        "flags",
+        "checksum",
+    )
+    _V1_FIELD_NAMES = (
+        "total_size",
+        "entry_offset",
+        "rel_data_offset",
+        "rel_data_size",
+        "text_offset",
+        "text_size",
+        "got_offset",
+        "got_size",
+        "data_offset",
+        "data_size",
+        "bss_mem_offset",
+        "bss_mem_size",
+        "min_stack_len",
+        "min_app_heap_len",
+        "min_kernel_heap_len",
+        "package_name_offset",
+        "package_name_size",
+        "checksum",
+    )
+
+    # Store the base fields as direct attributes rather than in a dict. This
+    # avoids a hash lookup on every field access and shrinks each header
+    # object.
+    __slots__ = (
+        "valid",
+        "app",
+        "modified",
+        "version",
+        "tlvs",
+        "_tlv_index",
+        "corrupt_tbf_base",
+        # Version 2 base fields.
+        "header_size",
+        "total_size",
+        "flags",
+        "checksum",
+        # Version 1-only base fields.
+        "entry_offset",
+        "rel_data_offset",
+        "rel_data_size",
+        "text_offset",
+        "text_size",
+        "got_offset",
+        "got_size",
+        "data_offset",
+        "data_size",
+        "bss_mem_offset",
+        "bss_mem_size",
+        "min_stack_len",
+        "min_app_heap_len",
+        "min_kernel_heap_len",
+        "package_name_offset",
+        "package_name_size",
+    )
+
+    _VERSION_STRUCT = struct.Struct("<H")
+    # 17 base fields plus the checksum. The same layout (with the version
+    # number in place of the checksum) is used to pack the header back up.
+    _V1_BASE_STRUCT = struct.Struct("<18I")
+    _V2_BASE_STRUCT = struct.Struct("<HIII")
+    _V2_PACK_STRUCT = struct.Struct("<HHIII")
+
+    def __new__(cls, buffer=None):
+        # Version 1 headers get their own subclass so the version checks in
+        # `__str__` and `object()` are resolved once, at construction, rather
+        # than on every call.
+        if cls is TBFHeader and buffer != None and len(buffer) >= 2:
+            if cls._VERSION_STRUCT.unpack_from(buffer)[0] == 1:
+                cls = TBFHeaderV1
+        return object.__new__(cls)
+
     def __init__(self, buffer):
         # Flag that records if this TBF header is valid. This is calculated once
         # when a new TBF header is read in. Any manipulations that tockloader
@@ -579,10 +950,11 @@ class TBFHeader:
         # re-flash the TBF header to the board.
         self.modified = False
 
-        # The base fields in the TBF header.
-        self.fields = {}
         # A list of TLV entries.
         self.tlvs = []
+        # TLVs indexed by ID for constant-time lookups. Rebuilt whenever
+        # `self.tlvs` changes.
+        self._tlv_index = {}
 
         full_buffer = buffer
 
@@ -591,137 +963,133 @@ class TBFHeader:
             return
 
         # Get the version number
-        self.version = struct.unpack("<H", buffer[0:2])[0]
+        self.version = self._VERSION_STRUCT.unpack(buffer[0:2])[0]
         buffer = buffer[2:]
 
         if self.version == 1 and len(buffer) >= 74:
-            checksum = self._checksum(full_buffer[0:72])
-            buffer = buffer[2:]
-            base = struct.unpack("<IIIIIIIIIIIIIIIIII", buffer[0:72])
-            buffer = buffer[72:]
-            self.fields["total_size"] = base[0]
-            self.fields["entry_offset"] = base[1]
-            self.fields["rel_data_offset"] = base[2]
-            self.fields["rel_data_size"] = base[3]
-            self.fields["text_offset"] = base[4]
-            self.fields["text_size"] = base[5]
-            self.fields["got_offset"] = base[6]
-            self.fields["got_size"] = base[7]
-            self.fields["data_offset"] = base[8]
-            self.fields["data_size"] = base[9]
-            self.fields["bss_mem_offset"] = base[10]
-            self.fields["bss_mem_size"] = base[11]
-            self.fields["min_stack_len"] = base[12]
-            self.fields["min_app_heap_len"] = base[13]
-            self.fields["min_kernel_heap_len"] = base[14]
-            self.fields["package_name_offset"] = base[15]
-            self.fields["package_name_size"] = base[16]
-            self.fields["checksum"] = base[17]
+            checksum = self._cached_checksum(full_buffer[0:72])
+            # Unpack all of the base fields (and the trailing checksum)
+            # straight into their slots in one go.
+            (
+                self.total_size,
+                self.entry_offset,
+                self.rel_data_offset,
+                self.rel_data_size,
+                self.text_offset,
+                self.text_size,
+                self.got_offset,
+                self.got_size,
+                self.data_offset,
+                self.data_size,
+                self.bss_mem_offset,
+                self.bss_mem_size,
+                self.min_stack_len,
+                self.min_app_heap_len,
+                self.min_kernel_heap_len,
+                self.package_name_offset,
+                self.package_name_size,
+                self.checksum,
+            ) = self._V1_BASE_STRUCT.unpack_from(full_buffer, 4)
             self.app = True
 
-            if checksum == self.fields["checksum"]:
+            if checksum == self.checksum:
                 self.valid = True
 
         elif self.version == 2 and len(buffer) >= 14:
-            base = struct.unpack("<HIII", buffer[0:14])
-            buffer = buffer[14:]
-            self.fields["header_size"] = base[0]
-            self.fields["total_size"] = base[1]
-            self.fields["flags"] = base[2]
-            self.fields["checksum"] = base[3]
-
-            if (
-                len(full_buffer) >= self.fields["header_size"]
-                and self.fields["header_size"] >= 16
-            ):
-                # Zero out checksum for checksum calculation.
-                nbuf = bytearray(self.fields["header_size"])
-                nbuf[:] = full_buffer[0 : self.fields["header_size"]]
-                struct.pack_into("<I", nbuf, 12, 0)
-                checksum = self._checksum(nbuf)
-
-                remaining = self.fields["header_size"] - 16
+            base = self._V2_BASE_STRUCT.unpack(buffer[0:14])
+            self.header_size = base[0]
+            self.total_size = base[1]
+            self.flags = base[2]
+            self.checksum = base[3]
+
+            if len(full_buffer) >= self.header_size and self.header_size >= 16:
+                # Zero out checksum for checksum calculation. Construct the
+                # bytearray from a memoryview slice so the header bytes are
+                # copied exactly once.
+                nbuf = bytearray(memoryview(full_buffer)[0 : self.header_size])
+                _UINT32_STRUCT.pack_into(nbuf, 12, 0)
+                checksum = self._cached_checksum(nbuf)
+
+                remaining = self.header_size - 16
 
                 # Now check to see if this is an app or padding.
-                if remaining > 0 and len(buffer) >= remaining:
+                if remaining > 0 and len(full_buffer) - 16 >= remaining:
                     # This is an application. That means we need more parsing.
                     self.app = True
 
-                    while remaining >= 4:
-                        base = struct.unpack("<HH", buffer[0:4])
-                        buffer = buffer[4:]
-                        tipe = base[0]
-                        length = base[1]
+                    # Walk the TLVs with an index into the original buffer.
+                    # Re-slicing the remainder on every iteration copies the
+                    # entire tail of the header each time. Hand each TLV a
+                    # memoryview slice so the payload bytes are not copied
+                    # either.
+                    view = memoryview(full_buffer)
+                    offset = 16
 
+                    while remaining >= 4:
+                        tipe, length = _TLV_HEADER_STRUCT.unpack_from(
+                            full_buffer, offset
+                        )
+                        offset += 4
                         remaining -= 4
 
-                        if tipe == TBFTLV.HEADER_TYPE_MAIN:
-                            if remaining >= 12 and length == 12:
-                                self.tlvs.append(TBFTLVMain(buffer[0:12]))
-
-                        elif tipe == TBFTLV.HEADER_TYPE_PROGRAM:
-                            if remaining >= 20 and length == 20:
-                                self.tlvs.append(TBFTLVProgram(buffer[0:20]))
-
-                        elif tipe == TBFTLV.HEADER_TYPE_WRITEABLE_FLASH_REGIONS:
-                            if remaining >= length:
+                        entry = _TLV_DISPATCH.get(tipe)
+                        if entry is not None:
+                            tlv_class, fixed_length = entry
+                            if fixed_length is not None:
+                                if remaining >= fixed_length and length == fixed_length:
+                                    self.tlvs.append(
+                                        tlv_class(view[offset : offset + fixed_length])
+                                    )
+                            elif remaining >= length:
                                 self.tlvs.append(
-                                    TBFTLVWriteableFlashRegions(buffer[0:length])
+                                    tlv_class(view[offset : offset + length])
                                 )
 
-                        elif tipe == TBFTLV.HEADER_TYPE_PACKAGE_NAME:
-                            if remaining >= length:
-                                self.tlvs.append(TBFTLVPackageName(buffer[0:length]))
-
-                        elif tipe == TBFTLV.HEADER_TYPE_PIC_OPTION_1:
-                            if remaining >= 40 and length == 40:
-                                self.tlvs.append(TBFTLVPicOption1(buffer[0:40]))
-
-                        elif tipe == TBFTLV.HEADER_TYPE_FIXED_ADDRESSES:
-                            if remaining >= 8 and length == 8:
-                                self.tlvs.append(TBFTLVFixedAddress(buffer[0:8]))
-
-                        elif tipe == TBFTLV.HEADER_TYPE_PERMISSIONS:
-                            if remaining >= length:
-                                self.tlvs.append(TBFTLVPermissions(buffer[0:length]))
-
-                        elif tipe == TBFTLV.HEADER_TYPE_PERSISTENT_ACL:
-                            if remaining >= length:
-                                self.tlvs.append(TBFTLVPersistentACL(buffer[0:length]))
-
-                        elif tipe == TBFTLV.HEADER_TYPE_KERNEL_VERSION:
-                            if remaining >= 4 and length == 4:
-                                self.tlvs.append(TBFTLVKernelVersion(buffer[0:4]))
-
                         else:
                             logging.warning("Unknown TLV block in TBF header.")
                             logging.warning("You might want to update tockloader.")
 
                             # Add the unknown data to the stored state so we can
                             # put it back afterwards.
-                            self.tlvs.append(TBFTLVUnknown(tipe, buffer[0:length]))
+                            self.tlvs.append(
+                                TBFTLVUnknown(tipe, view[offset : offset + length])
+                            )
 
                         # All blocks are padded to four byte, so we may need to
                         # round up.
-                        length = roundup(length, 4)
-                        buffer = buffer[length:]
+                        length = _roundup4(length)
+                        offset += length
                         remaining -= length
 
-                    if checksum == self.fields["checksum"]:
+                    self._reindex_tlvs()
+
+                    if checksum == self.checksum:
                         self.valid = True
                     else:
                         logging.error(
                             "Checksum mismatch. in packet: {:#x}, calculated: {:#x}".format(
-                                self.fields["checksum"], checksum
+                                self.checksum, checksum
                             )
                         )
                         self.valid = True
 
                 else:
                     # This is just padding and not an app.
-                    if checksum == self.fields["checksum"]:
+                    if checksum == self.checksum:
                         self.valid = True
 
+    @property
+    def fields(self):
+        """
+        The base fields of the header as a dict, for compatibility with
+        callers that predate the base fields being stored as attributes.
+        """
+        if getattr(self, "version", 0) == 1:
+            names = self._V1_FIELD_NAMES
+        else:
+            names = self._V2_FIELD_NAMES
+        return {name: getattr(self, name) for name in names if hasattr(self, name)}
+
     def is_valid(self):
         """
         Whether the CRC and other checks passed for this header.
@@ -752,7 +1120,7 @@ class TBFHeader:
             # Version 1 apps don't have this bit so they are just always enabled
             return True
         else:
-            return self.fields["flags"] & 0x01 == 0x01
+            return self.flags & 0x01 == 0x01
 
     def is_sticky(self):
         """
@@ -765,7 +1133,7 @@ class TBFHeader:
             # No sticky bit in version 1, so they are not sticky
             return False
         else:
-            return self.fields["flags"] & 0x02 == 0x02
+            return self.flags & 0x02 == 0x02
 
     def set_flag(self, flag_name, flag_value):
         """
@@ -778,23 +1146,23 @@ class TBFHeader:
 
         if flag_name == "enable":
             if flag_value:
-                self.fields["flags"] |= 0x01
+                self.flags |= 0x01
             else:
-                self.fields["flags"] &= ~0x01
+                self.flags &= ~0x01
             self.modified = True
 
         elif flag_name == "sticky":
             if flag_value:
-                self.fields["flags"] |= 0x02
+                self.flags |= 0x02
             else:
-                self.fields["flags"] &= ~0x02
+                self.flags &= ~0x02
             self.modified = True
 
     def get_app_size(self):
         """
         Get the total size the app takes in bytes in the flash of the chip.
         """
-        return self.fields["total_size"]
+        return self.total_size
 
     def set_app_size(self, size):
         """
@@ -803,7 +1171,7 @@ class TBFHeader:
         Since this does not change the header size we do not need to update
         any other fields in the header.
         """
-        self.fields["total_size"] = size
+        self.total_size = size
         self.modified = True
 
     def get_header_size(self):
@@ -814,7 +1182,7 @@ class TBFHeader:
         if self.version == 1:
             return 74
         else:
-            return self.fields["header_size"]
+            return self.header_size
 
     def get_size_before_app(self):
         """
@@ -823,7 +1191,7 @@ class TBFHeader:
         if self.version == 1:
             return 74
         else:
-            header_size = self.fields["header_size"]
+            header_size = self.header_size
 
             binary_tlv = self._get_binary_tlv()
             protected_size = binary_tlv.protected_size
@@ -838,12 +1206,12 @@ class TBFHeader:
         tlv = self._get_tlv(TBFTLV.HEADER_TYPE_PACKAGE_NAME)
         if tlv:
             return tlv.package_name
-        elif (
-            "package_name_offset" in self.fields and "package_name_size" in self.fields
+        elif hasattr(self, "package_name_offset") and hasattr(
+            self, "package_name_size"
         ):
             return (
-                self.fields["package_name_offset"],
-                self.fields["package_name_size"],
+                self.package_name_offset,
+                self.package_name_size,
             )
         else:
             return ""
@@ -902,7 +1270,7 @@ class TBFHeader:
         tlv = self._get_tlv(TBFTLV.HEADER_TYPE_PROGRAM)
         if tlv:
             footer_start = tlv.binary_end_offset
-            if footer_start < self.fields["total_size"]:
+            if footer_start < self.total_size:
                 return True
 
         return False
@@ -916,7 +1284,7 @@ class TBFHeader:
         if tlv:
             return tlv.binary_end_offset
         else:
-            return self.fields["total_size"]
+            return self.total_size
 
     def get_footer_size(self):
         """
@@ -924,7 +1292,7 @@ class TBFHeader:
         will return 0.
         """
         footer_start = self.get_binary_end_offset()
-        return self.fields["total_size"] - footer_start
+        return self.total_size - footer_start
 
     def delete_tlv(self, tlvid):
         """
@@ -943,13 +1311,14 @@ class TBFHeader:
             logging.debug("Removing TLV at index {}".format(index))
             self.tlvs.pop(index)
             self.modified = True
+        self._reindex_tlvs()
 
         # Now update the base information since we have changed the length.
-        self.fields["header_size"] -= size
+        self.header_size -= size
 
         # Support both Main and Program.
-        tlv_main = self._get_tlv(self.HEADER_TYPE_MAIN)
-        tlv_program = self._get_tlv(self.HEADER_TYPE_PROGRAM)
+        tlv_main = self._get_tlv(TBFTLV.HEADER_TYPE_MAIN)
+        tlv_program = self._get_tlv(TBFTLV.HEADER_TYPE_PROGRAM)
 
         # Increase the protected size so that the actual application
         # binary hasn't moved.
@@ -976,7 +1345,13 @@ class TBFHeader:
         """
         # 0 is a special id for the root fields
         if tlvid == 0:
-            self.fields[field] = value
+            try:
+                getattr(self, field)
+            except AttributeError:
+                raise TockLoaderException(
+                    'Field "{}" is not in the base TBF header'.format(field)
+                )
+            setattr(self, field, value)
         else:
             for tlv in self.tlvs:
                 if tlv.get_tlvid() == tlvid:
@@ -1007,19 +1382,17 @@ class TBFHeader:
             tlv_program = self._get_binary_tlv()
             # Now see if the header is already the right length.
             if (
-                address + self.fields["header_size"] + tlv_program.protected_size
+                address + self.header_size + tlv_program.protected_size
                 != tlv_fixed_addr.fixed_address_flash
             ):
                 # Make sure we need to make the header bigger
                 if (
-                    address + self.fields["header_size"] + tlv_program.protected_size
+                    address + self.header_size + tlv_program.protected_size
                     < tlv_fixed_addr.fixed_address_flash
                 ):
                     # The header is too small, so we can fix it.
                     delta = tlv_fixed_addr.fixed_address_flash - (
-                        address
-                        + self.fields["header_size"]
-                        + tlv_program.protected_size
+                        address + self.header_size + tlv_program.protected_size
                     )
                     # Increase the protected size to match this.
                     tlv_program.protected_size += delta
@@ -1047,40 +1420,51 @@ class TBFHeader:
         Get the TBF header in a bytes array.
         """
         if self.version == 1:
-            buf = struct.pack(
-                "<IIIIIIIIIIIIIIIIIII",
+            buf = self._V1_BASE_STRUCT.pack(
                 self.version,
-                self.fields["total_size"],
-                self.fields["entry_offset"],
-                self.fields["rel_data_offset"],
-                self.fields["rel_data_size"],
-                self.fields["text_offset"],
-                self.fields["text_size"],
-                self.fields["got_offset"],
-                self.fields["got_size"],
-                self.fields["data_offset"],
-                self.fields["data_size"],
-                self.fields["bss_mem_offset"],
-                self.fields["bss_mem_size"],
-                self.fields["min_stack_len"],
-                self.fields["min_app_heap_len"],
-                self.fields["min_kernel_heap_len"],
-                self.fields["package_name_offset"],
-                self.fields["package_name_size"],
+                self.total_size,
+                self.entry_offset,
+                self.rel_data_offset,
+                self.rel_data_size,
+                self.text_offset,
+                self.text_size,
+                self.got_offset,
+                self.got_size,
+                self.data_offset,
+                self.data_size,
+                self.bss_mem_offset,
+                self.bss_mem_size,
+                self.min_stack_len,
+                self.min_app_heap_len,
+                self.min_kernel_heap_len,
+                self.package_name_offset,
+                self.package_name_size,
             )
             checksum = self._checksum(buf)
-            buf += struct.pack("<I", checksum)
+            buf += _UINT32_STRUCT.pack(checksum)
 
         elif self.version == 2:
 
-            base = copy.deepcopy(self.fields)
-            base["version"] = self.version
+            base = {
+                "version": self.version,
+                "header_size": self.header_size,
+                "total_size": self.total_size,
+                "flags": self.flags,
+            }
 
             if hasattr(self, "corrupt_tbf_base"):
                 base[self.corrupt_tbf_base[0]] = self.corrupt_tbf_base[1]
 
-            buf = struct.pack(
-                "<HHIII",
+            # Preallocate the whole header and serialize every TLV in place
+            # rather than growing the buffer one TLV at a time.
+            binary_size = 16
+            if self.app:
+                binary_size += sum(tlv.get_size() for tlv in self.tlvs)
+
+            buf = bytearray(binary_size)
+            self._V2_PACK_STRUCT.pack_into(
+                buf,
+                0,
                 base["version"],
                 base["header_size"],
                 base["total_size"],
@@ -1088,15 +1472,12 @@ class TBFHeader:
                 0,
             )
             if self.app:
+                offset = 16
                 for tlv in self.tlvs:
-                    buf += tlv.pack()
-
-            nbuf = bytearray(len(buf))
-            nbuf[:] = buf
-            buf = nbuf
+                    offset += tlv.pack_into(buf, offset)
 
             checksum = self._checksum(buf[0 : base["header_size"]])
-            struct.pack_into("<I", buf, 12, checksum)
+            _UINT32_STRUCT.pack_into(buf, 12, checksum)
 
             tlv_binary = self._get_binary_tlv()
             if tlv_binary and tlv_binary.protected_size > 0:
@@ -1114,16 +1495,58 @@ class TBFHeader:
         # Add 0s to the end to make sure that we are multiple of 4.
         padding = len(buffer) % 4
         if padding != 0:
-            padding = 4 - padding
-            buffer += bytes([0] * padding)
-
-        # Loop throw
+            buffer = buffer + b"\x00" * (4 - padding)
+
+        if numpy is not None:
+            # XOR the 32-bit words in one vectorized reduction.
+            words = numpy.frombuffer(buffer, dtype="<u4")
+            return int(numpy.bitwise_xor.reduce(words))
+
+        if len(buffer) >= 64:
+            # For large buffers, fold the whole thing as a single big
+            # integer: repeatedly XOR the top half onto the bottom half
+            # until one 32-bit word remains. Each fold is one C-level
+            # bignum operation, so this takes O(log n) Python steps.
+            acc = int.from_bytes(buffer, "little")
+            bits = len(buffer) * 8
+            while bits > 32:
+                half = bits // 2
+                if half % 32 != 0:
+                    # Odd number of words: peel the top word off first so
+                    # both halves stay word-aligned.
+                    bits -= 32
+                    acc = (acc & ((1 << bits) - 1)) ^ (acc >> bits)
+                    continue
+                acc = (acc & ((1 << half) - 1)) ^ (acc >> half)
+                bits = half
+            return acc
+
+        # Iterate the buffer as little-endian 32-bit words with the
+        # precompiled Struct, which avoids re-parsing the format string
+        # per word and needs no byte-order fixup on big-endian hosts.
         checksum = 0
-        for i in range(0, len(buffer), 4):
-            checksum ^= struct.unpack("<I", buffer[i : i + 4])[0]
+        for (word,) in _UINT32_STRUCT.iter_unpack(buffer):
+            checksum ^= word
 
         return checksum
 
+    def _cached_checksum(self, buffer):
+        """
+        Calculate the TBF header checksum, memoized on the header bytes so
+        that re-parsing an identical header skips the calculation.
+        """
+        key = hashlib.blake2b(buffer, digest_size=8).digest()
+        checksum = _CHECKSUM_CACHE.get(key)
+        if checksum is not None:
+            _CHECKSUM_CACHE.move_to_end(key)
+            return checksum
+
+        checksum = self._checksum(buffer)
+        _CHECKSUM_CACHE[key] = checksum
+        if len(_CHECKSUM_CACHE) > _CHECKSUM_CACHE_SIZE:
+            _CHECKSUM_CACHE.popitem(last=False)
+        return checksum
+
     def _get_binary_tlv(self):
         """
         Get the TLV for the binary header, whether it's a program or main.
@@ -1137,56 +1560,51 @@ class TBFHeader:
                 tlv = TBFTLVProgram(None, self.get_app_size())
         return tlv
 
+    def _reindex_tlvs(self):
+        """
+        Rebuild the TLV ID index after `self.tlvs` changes. `_get_tlv`
+        returns the first TLV with a matching ID, so only the first TLV of
+        each ID is indexed.
+        """
+        index = {}
+        for tlv in self.tlvs:
+            index.setdefault(tlv.get_tlvid(), tlv)
+        self._tlv_index = index
+
     def _get_tlv(self, tlvid):
         """
         Return the TLV from the self.tlvs array if it exists.
         """
-        for tlv in self.tlvs:
-            if tlv.get_tlvid() == tlvid:
-                return tlv
-        return None
+        return self._tlv_index.get(tlvid)
 
     def __str__(self):
-        out = ""
+        parts = []
 
         if not self.valid:
-            out += "INVALID!\n"
-
-        out += "{:<22}: {}\n".format("version", self.version)
-
-        # Special case version 1. However, at this point (May 2020), I would be
-        # shocked if this ever gets run on a version 1 TBFH.
-        if self.version == 1:
-            for k, v in sorted(self.fields.items()):
-                if k == "checksum":
-                    out += "{:<22}:            {:>#12x}\n".format(k, v)
-                else:
-                    out += "{:<22}: {:>10} {:>#12x}\n".format(k, v, v)
+            parts.append("INVALID!\n")
 
-                if k == "flags":
-                    values = ["No", "Yes"]
-                    out += "  {:<20}: {}\n".format("enabled", values[(v >> 0) & 0x01])
-                    out += "  {:<20}: {}\n".format("sticky", values[(v >> 1) & 0x01])
-            return out
+        parts.append("{:<22}: {}\n".format("version", self.version))
 
         # Base fields that always exist.
-        out += "{:<22}: {:>10} {:>#12x}\n".format(
-            "header_size", self.fields["header_size"], self.fields["header_size"]
-        )
-        out += "{:<22}: {:>10} {:>#12x}\n".format(
-            "total_size", self.fields["total_size"], self.fields["total_size"]
+        parts.append(
+            "{:<22}: {:>10} {:>#12x}\n".format(
+                "header_size", self.header_size, self.header_size
+            )
         )
-        out += "{:<22}:            {:>#12x}\n".format(
-            "checksum", self.fields["checksum"]
+        parts.append(
+            "{:<22}: {:>10} {:>#12x}\n".format(
+                "total_size", self.total_size, self.total_size
+            )
         )
-        out += "{:<22}: {:>10} {:>#12x}\n".format(
-            "flags", self.fields["flags"], self.fields["flags"]
+        parts.append("{:<22}:            {:>#12x}\n".format("checksum", self.checksum))
+        parts.append(
+            "{:<22}: {:>10} {:>#12x}\n".format("flags", self.flags, self.flags)
         )
-        out += "  {:<20}: {}\n".format(
-            "enabled", ["No", "Yes"][(self.fields["flags"] >> 0) & 0x01]
+        parts.append(
+            "  {:<20}: {}\n".format("enabled", _YES_NO[(self.flags >> 0) & 0x01])
         )
-        out += "  {:<20}: {}\n".format(
-            "sticky", ["No", "Yes"][(self.fields["flags"] >> 1) & 0x01]
+        parts.append(
+            "  {:<20}: {}\n".format("sticky", _YES_NO[(self.flags >> 1) & 0x01])
         )
 
         # Base header takes 16 bytes.
@@ -1201,27 +1619,20 @@ class TBFHeader:
             lines = tlv_str.split("\n")
             lines[0] = "{:<48}{}".format(lines[0], offset)
             # Recreate string.
-            out += "\n".join(lines)
+            parts.append("\n".join(lines))
 
             # Increment the byte index with the size of the TLV.
             index += tlv.get_size()
 
-        return out
+        return "".join(parts)
 
     def object(self):
         out = {"version": self.version}
 
-        # Special case version 1. However, at this point (May 2020), I would be
-        # shocked if this ever gets run on a version 1 TBFH.
-        if self.version == 1:
-            for k, v in sorted(self.fields.items()):
-                out[k] = v
-            return out
-
-        out["header_size"] = self.fields["header_size"]
-        out["total_size"] = self.fields["total_size"]
-        out["checksum"] = self.fields["checksum"]
-        out["flags"] = self.fields["flags"]
+        out["header_size"] = self.header_size
+        out["total_size"] = self.total_size
+        out["checksum"] = self.checksum
+        out["flags"] = self.flags
 
         out["tlvs"] = []
         for tlv in self.tlvs:
@@ -1230,6 +1641,46 @@ class TBFHeader:
         return out
 
 
+class TBFHeaderV1(TBFHeader):
+    """
+    A version 1 TBF header. At this point (May 2020), I would be shocked if
+    this ever gets parsed, so only the formatting paths are specialized here
+    and the common parsing logic lives in `TBFHeader`.
+    """
+
+    __slots__ = ()
+
+    def __str__(self):
+        parts = []
+
+        if not self.valid:
+            parts.append("INVALID!\n")
+
+        parts.append("{:<22}: {}\n".format("version", self.version))
+
+        for k, v in sorted(self.fields.items()):
+            if k == "checksum":
+                parts.append("{:<22}:            {:>#12x}\n".format(k, v))
+            else:
+                parts.append("{:<22}: {:>10} {:>#12x}\n".format(k, v, v))
+
+            if k == "flags":
+                parts.append(
+                    "  {:<20}: {}\n".format("enabled", _YES_NO[(v >> 0) & 0x01])
+                )
+                parts.append(
+                    "  {:<20}: {}\n".format("sticky", _YES_NO[(v >> 1) & 0x01])
+                )
+        return "".join(parts)
+
+    def object(self):
+        out = {"version": self.version}
+
+        for k, v in sorted(self.fields.items()):
+            out[k] = v
+        return out
+
+
 class TBFHeaderPadding(TBFHeader):
     """
     TBF Header that is only padding between apps. Since apps are packed as
@@ -1245,15 +1696,66 @@ class TBFHeaderPadding(TBFHeader):
         self.valid = True
         self.app = False
         self.modified = False
-        self.fields = {}
         self.tlvs = []
+        self._tlv_index = {}
 
         self.version = 2
-        # self.fields['header_size'] = 14 # this causes interesting bugs...
-        self.fields["header_size"] = 16
-        self.fields["total_size"] = size
-        self.fields["flags"] = 0
-        self.fields["checksum"] = self._checksum(self.get_binary())
+        # self.header_size = 14 # this causes interesting bugs...
+        self.header_size = 16
+        self.total_size = size
+        self.flags = 0
+        # A padding header is just the four base words (with flags zero and
+        # the checksum field zeroed while checksumming), so the checksum
+        # reduces to XORing the first two words. No need to serialize the
+        # header just to compute it.
+        self.checksum = (self.version | (self.header_size << 16)) ^ (size & 0xFFFFFFFF)
+
+
+class TBFIntegrity:
+    """
+    The region of a TBF covered by integrity: the TBF header followed by the
+    application binary. Digests over the region are computed lazily and
+    memoized per algorithm, so checking several hash credentials against the
+    same app only hashes the binary once.
+    """
+
+    def __init__(self, tbfh, app_binary):
+        # Keep a memoryview so hashing reads the underlying buffer directly
+        # without making a copy, even if we were handed a slice.
+        self._tbfh = tbfh
+        self._app_binary = memoryview(app_binary)
+        self._digests = {}
+        self._header_binary = None
+
+    def _header(self):
+        # Serialize the header only when a digest is actually requested.
+        # Footers without hash credentials then never pay for it.
+        if self._header_binary == None:
+            self._header_binary = memoryview(bytes(self._tbfh.get_binary()))
+        return self._header_binary
+
+    def digest(self, algo):
+        """
+        Get the digest of the integrity region using the named hashlib
+        algorithm (e.g. "sha256").
+        """
+        digest = self._digests.get(algo)
+        if digest == None:
+            h = hashlib.new(algo)
+            h.update(self._header())
+            h.update(self._app_binary)
+            digest = h.digest()
+            self._digests[algo] = digest
+        return digest
+
+    def update_hash(self, h):
+        """
+        Feed the integrity region into an externally created hash object
+        (anything with an `update` method, e.g. a pycryptodome hash), without
+        building the region as one contiguous buffer.
+        """
+        h.update(self._header())
+        h.update(self._app_binary)
 
 
 class TBFFooterTLVCredentials(TBFTLV):
@@ -1271,7 +1773,7 @@ class TBFFooterTLVCredentials(TBFTLV):
     CREDENTIALS_TYPE_SHA512 = 0x05
     CREDENTIALS_TYPE_CLEARTEXTID = 0xF1
 
-    def __init__(self, buffer, integrity_blob):
+    def __init__(self, buffer):
 
         # Valid means the TLV parsed correctly.
         self.valid = False
@@ -1307,7 +1809,6 @@ class TBFFooterTLVCredentials(TBFTLV):
                 if len(self.buffer) == 32:
                     # SHA256 is 256 bits (32 bytes) long.
                     self.valid = True
-                self.verify([], integrity_blob)
 
             elif credentials_type == self.CREDENTIALS_TYPE_SHA384:
                 self.credentials_type = self.CREDENTIALS_TYPE_SHA384
@@ -1315,7 +1816,6 @@ class TBFFooterTLVCredentials(TBFTLV):
                 if len(self.buffer) == 48:
                     # SHA384 is 384 bits (48 bytes) long.
                     self.valid = True
-                self.verify([], integrity_blob)
 
             elif credentials_type == self.CREDENTIALS_TYPE_SHA512:
                 self.credentials_type = self.CREDENTIALS_TYPE_SHA512
@@ -1323,7 +1823,6 @@ class TBFFooterTLVCredentials(TBFTLV):
                 if len(self.buffer) == 64:
                     # SHA512 is 512 bits (64 bytes) long.
                     self.valid = True
-                self.verify([], integrity_blob)
 
             elif credentials_type == self.CREDENTIALS_TYPE_RSA4096KEY:
                 self.credentials_type = self.CREDENTIALS_TYPE_RSA4096KEY
@@ -1338,18 +1837,9 @@ class TBFFooterTLVCredentials(TBFTLV):
                 logging.warning("You might want to update tockloader.")
 
     def _credentials_type_to_str(self):
-        names = [
-            "Reserved",
-            "RSA3072KEY",
-            "RSA4096KEY",
-            "SHA256",
-            "SHA384",
-            "SHA512",
-        ]
-
         name = (
-            names[self.credentials_type]
-            if self.credentials_type < len(names)
+            _CREDENTIALS_TYPE_NAMES[self.credentials_type]
+            if self.credentials_type < len(_CREDENTIALS_TYPE_NAMES)
             else "Unknown"
         )
         return name
@@ -1366,32 +1856,32 @@ class TBFFooterTLVCredentials(TBFTLV):
         }
         return ids.get(credential_type)
 
-    def verify(self, keys, integrity_blob):
-        if integrity_blob == None:
+    def verify(self, keys, integrity):
+        if integrity == None:
             # If we don't have the actual binary then we can't verify any
             # credentials. This can happen if the app came from a board and we
             # didn't read the entire app binary.
             return
 
         if self.credentials_type == self.CREDENTIALS_TYPE_SHA256:
-            hash = hashlib.sha256(integrity_blob).digest()
-            if self.buffer == hash:
+            hash = integrity.digest("sha256")
+            if hmac.compare_digest(self.buffer, hash):
                 self.verified = "yes"
             else:
                 self.verified = "no"
                 logging.warning("SHA256 hash in footer does not match binary.")
 
         elif self.credentials_type == self.CREDENTIALS_TYPE_SHA384:
-            hash = hashlib.sha384(integrity_blob).digest()
-            if self.buffer == hash:
+            hash = integrity.digest("sha384")
+            if hmac.compare_digest(self.buffer, hash):
                 self.verified = "yes"
             else:
                 self.verified = "no"
                 logging.warning("SHA384 hash in footer does not match binary.")
 
         elif self.credentials_type == self.CREDENTIALS_TYPE_SHA512:
-            hash = hashlib.sha512(integrity_blob).digest()
-            if self.buffer == hash:
+            hash = integrity.digest("sha512")
+            if hmac.compare_digest(self.buffer, hash):
                 self.verified = "yes"
             else:
                 self.verified = "no"
@@ -1400,6 +1890,9 @@ class TBFFooterTLVCredentials(TBFTLV):
         elif self.credentials_type == self.CREDENTIALS_TYPE_RSA4096KEY:
             logging.debug("Verifying the RSA4096KEY credential.")
 
+            from Crypto.Hash import SHA512
+            from Crypto.Signature import pkcs1_15
+
             # Unpack the credential buffer.
             pub_key_n_bytes = self.buffer[0:512]
             signature = self.buffer[512:1024]
@@ -1407,28 +1900,24 @@ class TBFFooterTLVCredentials(TBFTLV):
             # Need an integer for n to compare to the public keys.
             pub_key_n = int.from_bytes(pub_key_n_bytes, "big")
 
-            # First see if there is a key that matches. If no keys match then we
-            # can't verify this credential one way or another.
-            for key in keys:
-
-                # Compare the n value in the credential to the n included in the
-                # public key passed to tockloader.
-                if pub_key_n == key.n:
-                    # We found a key that matches. Get the hash of the main app
-                    # and then check the signature.
-                    hash = Crypto.Hash.SHA512.new(integrity_blob)
-
-                    try:
-                        Crypto.Signature.pkcs1_15.new(key).verify(hash, signature)
-                        # Signature verified!
-                        self.verified = "yes"
-                    except:
-                        # We were able to verify that the signature does not
-                        # match.
-                        self.verified = "no"
-
-                    # Only try one matching key.
-                    break
+            # First see if there is a key that matches the n value in the
+            # credential. If no keys match then we can't verify this credential
+            # one way or another.
+            key = keys.get(pub_key_n)
+            if key != None:
+                # We found a key that matches. Get the hash of the main app
+                # and then check the signature.
+                hash = SHA512.new()
+                integrity.update_hash(hash)
+
+                try:
+                    pkcs1_15.new(key).verify(hash, signature)
+                    # Signature verified!
+                    self.verified = "yes"
+                except:
+                    # We were able to verify that the signature does not
+                    # match.
+                    self.verified = "no"
 
     def shrink(self, num_bytes):
         """
@@ -1441,9 +1930,11 @@ class TBFFooterTLVCredentials(TBFTLV):
             else:
                 self.buffer = bytearray()
 
+    def get_size(self):
+        return 8 + len(self.buffer)
+
     def pack(self):
-        buf = struct.pack(
-            "<HHI",
+        buf = _CRED_TLV_STRUCT.pack(
             self.TLVID,
             4 + len(self.buffer),
             self.credentials_type,
@@ -1451,6 +1942,13 @@ class TBFFooterTLVCredentials(TBFTLV):
 
         return buf + self.buffer
 
+    def pack_into(self, buffer, offset):
+        _CRED_TLV_STRUCT.pack_into(
+            buffer, offset, self.TLVID, 4 + len(self.buffer), self.credentials_type
+        )
+        buffer[offset + 8 : offset + 8 + len(self.buffer)] = self.buffer
+        return 8 + len(self.buffer)
+
     def __str__(self):
         verified = ""
         if self.verified == "yes":
@@ -1458,20 +1956,24 @@ class TBFFooterTLVCredentials(TBFTLV):
         elif self.verified == "no":
             verified = " ✗ verified failed"
 
-        out = "Footer TLV: Credentials ({})\n".format(self.TLVID)
-        out += "  Type: {} ({}){}\n".format(
-            self._credentials_type_to_str(), self.credentials_type, verified
+        parts = ["Footer TLV: Credentials ({})\n".format(self.TLVID)]
+        parts.append(
+            "  Type: {} ({}){}\n".format(
+                self._credentials_type_to_str(), self.credentials_type, verified
+            )
         )
-        out += "  Length: {}\n".format(len(self.buffer))
+        parts.append("  Length: {}\n".format(len(self.buffer)))
 
         if self.credentials_type == self.CREDENTIALS_TYPE_CLEARTEXTID:
-            out += "  Value: {}\n".format(struct.unpack("<Q", self.buffer[0:8])[0])
+            parts.append(
+                "  Value: {}\n".format(struct.unpack("<Q", self.buffer[0:8])[0])
+            )
 
-        # out += "  Data: "
-        # out += " ".join("{:02x}".format(x) for x in self.buffer)
-        # out += "\n\n"
+        # parts.append("  Data: ")
+        # parts.append(" ".join("{:02x}".format(x) for x in self.buffer))
+        # parts.append("\n\n")
 
-        return out
+        return "".join(parts)
 
     def object(self):
         return {
@@ -1522,12 +2024,16 @@ class TBFFooterTLVCredentialsConstructor(TBFFooterTLVCredentials):
             self.valid = True
             self.verified = "yes"
         elif self.credentials_type == self.CREDENTIALS_TYPE_RSA4096KEY:
+            from Crypto.Hash import SHA512
+            from Crypto.PublicKey import RSA
+            from Crypto.Signature import pkcs1_15
+
             # Load keys to Crypto objects.
-            pub_key = Crypto.PublicKey.RSA.importKey(public_key)
-            pri_key = Crypto.PublicKey.RSA.importKey(private_key)
+            pub_key = RSA.importKey(public_key)
+            pri_key = RSA.importKey(private_key)
             # Compute hash and signature.
-            hash = Crypto.Hash.SHA512.new(integrity_blob)
-            signature = Crypto.Signature.pkcs1_15.new(pri_key).sign(hash)
+            hash = SHA512.new(integrity_blob)
+            signature = pkcs1_15.new(pri_key).sign(hash)
             # Store the pub key n value and the signature.
             self.buffer = pub_key.n.to_bytes(512, "big") + signature
         else:
@@ -1550,44 +2056,35 @@ class TBFFooter:
         # Keep track if tockloader has modified the footer.
         self.modified = False
 
-        # So we can check the credentials, create the binary blob covered by
-        # integrity if it was provided to us. If the app came from a board then
-        # we may not have the app binary to use.
-        if app_binary != None:
-            integrity_blob = tbfh.get_binary() + app_binary
-        else:
-            integrity_blob = None
-
-        # Iterate all TLVs and add to list.
-        position = 0
-        while position < len(buffer):
-            base = struct.unpack("<HH", buffer[0:4])
-            buffer = buffer[4:]
-            tlv_type = base[0]
-            tlv_length = base[1]
+        # Iterate all TLVs and add to list. Walk the buffer with an offset
+        # cursor over a memoryview so no slice of the remainder is copied on
+        # each step, and stop cleanly if a truncated TLV is encountered.
+        view = memoryview(buffer)
+        length = len(view)
+        offset = 0
+        while offset + 4 <= length:
+            tlv_type, tlv_length = _TLV_HEADER_STRUCT.unpack_from(view, offset)
+            offset += 4
 
-            remaining = len(buffer)
             if tlv_type == self.FOOTER_TYPE_CREDENTIALS:
-                if remaining >= tlv_length:
+                if offset + tlv_length <= length:
                     self.tlvs.append(
-                        TBFFooterTLVCredentials(buffer[0:tlv_length], integrity_blob)
+                        TBFFooterTLVCredentials(
+                            bytes(view[offset : offset + tlv_length])
+                        )
                     )
 
-            buffer = buffer[tlv_length:]
+            offset += tlv_length
 
     def delete_tlv(self, tlvid):
         """
         Delete a particular TLV by ID if it exists.
         """
-        indices = []
-        for i, tlv in enumerate(self.tlvs):
-            if tlv.get_tlvid() == tlvid:
-                # Reverse the list
-                indices.insert(0, i)
-        # Pop starting with the last match
-        for index in indices:
-            logging.debug("Removing TLV at index {}".format(index))
-            self.tlvs.pop(index)
+        before = len(self.tlvs)
+        self.tlvs = [tlv for tlv in self.tlvs if tlv.get_tlvid() != tlvid]
+        removed = before - len(self.tlvs)
+        if removed > 0:
+            logging.debug("Removed {} TLV(s) with ID {}".format(removed, tlvid))
             self.modified = True
 
     def add_credential(
@@ -1689,41 +2186,55 @@ class TBFFooter:
         """
         Remove credential by credential id.
         """
-        indices = []
-        for i, tlv in enumerate(self.tlvs):
-            if tlv.get_tlvid() == self.FOOTER_TYPE_CREDENTIALS:
-                if tlv.credentials_type == credential_id:
-                    # Reverse the list
-                    indices.insert(0, i)
-        # Pop starting with the last match
-        for index in indices:
-            logging.debug("Removing credential TLV at index {}".format(index))
-            self.tlvs.pop(index)
+        before = len(self.tlvs)
+        self.tlvs = [
+            tlv
+            for tlv in self.tlvs
+            if not (
+                tlv.get_tlvid() == self.FOOTER_TYPE_CREDENTIALS
+                and tlv.credentials_type == credential_id
+            )
+        ]
+        removed = before - len(self.tlvs)
+        if removed > 0:
+            logging.debug(
+                "Removed {} credential TLV(s) with ID {}".format(removed, credential_id)
+            )
             self.modified = True
 
-    def verify_credentials(self, public_keys, integrity_blob):
+    def verify_credentials(self, public_keys, integrity):
         """
         Check credential TLVs with an optional array of public keys (stored as
-        binary arrays).
+        binary arrays) and a `TBFIntegrity` over the covered region. One
+        integrity object is shared by all TLVs, so each hash algorithm is
+        computed at most once per call.
         """
-        # Load all provided keys as Crypto objects.
-        keys = []
+        # Load all provided keys as Crypto objects, indexed by their n value
+        # so credentials can find a matching key with one lookup.
+        keys = {}
         if public_keys:
+            from Crypto.PublicKey import RSA
+
             for public_key in public_keys:
-                key = Crypto.PublicKey.RSA.importKey(public_key)
-                keys.append(key)
+                key = RSA.importKey(public_key)
+                keys[key.n] = key
 
         for tlv in self.tlvs:
-            tlv.verify(keys, integrity_blob)
+            tlv.verify(keys, integrity)
 
     def get_binary(self):
         """
         Get the TBF footer in a bytes array.
         """
-        buf = bytearray()
-        if self.version == 2:
-            for tlv in self.tlvs:
-                buf += tlv.pack()
+        if self.version != 2:
+            return bytearray()
+
+        # Preallocate the full footer and pack each TLV in place rather than
+        # growing a bytearray TLV by TLV.
+        buf = bytearray(sum(tlv.get_size() for tlv in self.tlvs))
+        offset = 0
+        for tlv in self.tlvs:
+            offset += tlv.pack_into(buf, offset)
 
         return buf
 
@@ -1736,14 +2247,16 @@ class TBFFooter:
     def __str__(self):
         footer_size = self.get_size()
 
-        out = "Footer\n"
-        out += "{:<22}: {:>10} {:>#12x}\n".format(
-            "  footer_size", footer_size, footer_size
+        parts = ["Footer\n"]
+        parts.append(
+            "{:<22}: {:>10} {:>#12x}\n".format(
+                "  footer_size", footer_size, footer_size
+            )
         )
 
         for tlv in self.tlvs:
-            out += str(tlv)
-        return out
+            parts.append(str(tlv))
+        return "".join(parts)
 
     def object(self):
         out = {"version": self.version, "tlvs": []}